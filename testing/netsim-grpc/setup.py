@@ -6,6 +6,8 @@
     PyScaffold helps you to put up the scaffold of your new Python project.
     Learn more under: https://pyscaffold.org/
 """
+import hashlib
+import json
 import os
 import subprocess
 import sys
@@ -14,6 +16,26 @@ from os import path
 from setuptools import setup
 from setuptools.command.build_py import build_py
 
+# Records the content hash of every compiled .proto, relative to the output dir.
+PROTO_HASHES = ".proto_hashes.json"
+
+
+def _protoc_version():
+    """Returns the installed grpcio-tools version, or an empty string."""
+    try:
+        from grpc_tools import grpc_version
+    except ImportError:
+        return ""
+    return grpc_version.VERSION
+
+
+def _proto_digest(source, protoc_version):
+    """Hashes a .proto file together with the protoc version compiling it."""
+    digest = hashlib.blake2b(protoc_version.encode(), digest_size=16)
+    with open(source, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
 
 class ProtoBuild(build_py):
     """
@@ -31,55 +53,60 @@ class ProtoBuild(build_py):
         rootcanal_proto_dir = path.join(rootcanal_proto_root_dir, "rootcanal")
         out_dir = path.join(here, "src", "netsim_grpc", "proto")
 
-        # Rootcanal Protobufs
-        for proto_file in filter(
-            lambda x: x.endswith(".proto"), os.listdir(rootcanal_proto_dir)
-        ):
-            source = path.join(rootcanal_proto_dir, proto_file)
-            output = path.join(out_dir, "rootcanal", proto_file).replace(".proto", "_pb2.py")
-
-            if not path.exists(output) or (
-                path.getmtime(source) > path.getmtime(output)
-            ):
-                sys.stderr.write(f"Protobuf-compiling {source}\n")
-
-                subprocess.check_call(
-                    [
-                        sys.executable,
-                        "-m",
-                        "grpc_tools.protoc",
-                        f"-I{proto_root_dir}",
-                        f"-I{rootcanal_proto_root_dir}",
-                        f"--python_out={out_dir}",
-                        f"--grpc_python_out={out_dir}",
-                        source,
-                    ]
-                )
-
-        # Netsim Protobufs
-        for proto_file in filter(
-            lambda x: x.endswith(".proto"), os.listdir(proto_dir)
+        # Protos are compared by content rather than mtime, as git checkouts
+        # reset mtimes and would otherwise force (or hide) recompiles.
+        hashes_file = path.join(out_dir, PROTO_HASHES)
+        try:
+            with open(hashes_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        protoc_version = _protoc_version()
+
+        # Collect out-of-date protos from both directories first so they are
+        # compiled by a single protoc invocation instead of one per file.
+        hashes = {}
+        stale = []
+        for src_dir, pkg in (
+            (rootcanal_proto_dir, "rootcanal"),  # Rootcanal Protobufs
+            (proto_dir, "netsim"),  # Netsim Protobufs
         ):
-            source = path.join(proto_dir, proto_file)
-            output = path.join(out_dir, "netsim", proto_file).replace(".proto", "_pb2.py")
-
-            if not path.exists(output) or (
-                path.getmtime(source) > path.getmtime(output)
-            ):
-                sys.stderr.write(f"Protobuf-compiling {source}\n")
-
-                subprocess.check_call(
-                    [
-                        sys.executable,
-                        "-m",
-                        "grpc_tools.protoc",
-                        f"-I{proto_root_dir}",
-                        f"-I{rootcanal_proto_root_dir}",
-                        f"--python_out={out_dir}",
-                        f"--grpc_python_out={out_dir}",
-                        source,
-                    ]
-                )
+            with os.scandir(src_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".proto"):
+                        continue
+                    key = f"{pkg}/{entry.name}"
+                    output = path.join(out_dir, pkg, entry.name).replace(".proto", "_pb2.py")
+
+                    hashes[key] = _proto_digest(entry.path, protoc_version)
+                    if cached.get(key) != hashes[key] or not path.exists(output):
+                        stale.append(entry.path)
+
+        if stale:
+            names = " ".join(path.basename(source) for source in stale)
+            sys.stderr.write(f"Protobuf-compiling {names}\n")
+            # Capture protoc output and only surface it when compilation fails.
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "grpc_tools.protoc",
+                    f"-I{proto_root_dir}",
+                    f"-I{rootcanal_proto_root_dir}",
+                    f"--python_out={out_dir}",
+                    f"--grpc_python_out={out_dir}",
+                    *stale,
+                ],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode:
+                sys.stderr.write(result.stdout + result.stderr)
+                result.check_returncode()
+
+        if hashes != cached:
+            with open(hashes_file, "w") as f:
+                json.dump(hashes, f, indent=2, sort_keys=True)
 
         super().run()
 
@@ -1,6 +1,9 @@
 """Network simulator Python gRPC client."""
+import atexit
+import functools
 import logging
 import os
+import threading
 from typing import Dict, Optional
 
 import grpc
@@ -13,18 +16,50 @@ from netsim_grpc.proto.netsim import (
 )
 from google.protobuf import empty_pb2
 
-_Empty = empty_pb2.Empty
+# Empty requests are never mutated, so a single instance is shared by all RPCs.
+_EMPTY = empty_pb2.Empty()
 _Channel = grpc.Channel
 
 NETSIM_INI = 'netsim.ini'
 
+# gRPC channels shared by all NetsimClients, keyed by server address.
+_CHANNELS: Dict[str, _Channel] = {}
+_CHANNELS_LOCK = threading.Lock()
+
+# netsimd always listens on localhost, so skip HTTP proxy and DNS SRV lookups.
+_CHANNEL_OPTIONS = (
+    ('grpc.enable_http_proxy', 0),
+    ('grpc.dns_enable_srv_queries', 0),
+)
+
+# Maps each radio to its chip kind and the chip field holding its state.
+_RADIO_CHIPS = {
+    model.PhyKind.BLUETOOTH_CLASSIC: (
+        common.ChipKind.BLUETOOTH, lambda chip: chip.bt.classic
+    ),
+    model.PhyKind.BLUETOOTH_LOW_ENERGY: (
+        common.ChipKind.BLUETOOTH, lambda chip: chip.bt.low_energy
+    ),
+    model.PhyKind.WIFI: (common.ChipKind.WIFI, lambda chip: chip.wifi),
+    model.PhyKind.UWB: (common.ChipKind.UWB, lambda chip: chip.uwb),
+}
+
 
 class SetupError(Exception):
   """Class for exceptions related to netsim setup."""
 
 
 class NetsimClient(object):
-  """Network simulator client."""
+  """Network simulator client.
+
+  Can be used as a context manager to scope the client to a block:
+
+    with NetsimClient() as client:
+      client.reset()
+
+  Leaving the block only closes this client. The gRPC channel is shared with
+  other clients and is closed by shutdown_all(), which also runs at exit.
+  """
 
   def __init__(self):
     """Create a NetsimClient.
@@ -36,7 +71,14 @@ class NetsimClient(object):
     self._channel = _create_frontend_grpc_channel(
         self._server_addr
     )
-    self._stub = frontend_grpc.FrontendServiceStub(self._channel)
+    self._frontend_stub = frontend_grpc.FrontendServiceStub(self._channel)
+    self._closed = False
+
+  @property
+  def _stub(self) -> frontend_grpc.FrontendServiceStub:
+    if self._closed:
+      raise ValueError('Cannot invoke RPC on a closed NetsimClient.')
+    return self._frontend_stub
 
   def get_version(self) -> str:
     """Get the version of the netsim daemon.
@@ -44,7 +86,7 @@ class NetsimClient(object):
     Returns:
       The netsim daemon version.
     """
-    return self._stub.GetVersion(_Empty()).version
+    return self._stub.GetVersion(_EMPTY).version
 
   def get_devices(self) -> Dict[str, model.Device]:
     """Get info for all devices connected to netsim.
@@ -52,9 +94,24 @@ class NetsimClient(object):
     Returns:
       A dict mapping each connected device to its netsim properties.
     """
-    response = self._stub.ListDevice(_Empty())
+    response = self._stub.ListDevice(_EMPTY)
     return {device.name: device for device in response.devices}
 
+  def get_device(self, device_name: str) -> Optional[model.Device]:
+    """Get info for a single device connected to netsim.
+
+    Args:
+      device_name: The avd name of the specified device.
+
+    Returns:
+      The device's netsim properties, or None if it is not connected.
+    """
+    response = self._stub.ListDevice(_EMPTY)
+    return next(
+        (device for device in response.devices if device.name == device_name),
+        None,
+    )
+
   def set_position(
       self,
       device_name: str,
@@ -80,18 +137,17 @@ class NetsimClient(object):
       logging.info(
           'Setting new position for device %s: %s', device_name, position
       )
-      request.device.position.x = position.x
-      request.device.position.y = position.y
-      request.device.position.z = position.z
+      request.device.position.CopyFrom(position)
     if orientation:
       logging.info(
           'Setting new orientation for device %s: %s', device_name, orientation
       )
-      request.device.orientation.yaw = orientation.yaw
-      request.device.orientation.pitch = orientation.pitch
-      request.device.orientation.roll = orientation.roll
+      request.device.orientation.CopyFrom(orientation)
     self._stub.PatchDevice(request)
-    device_info = self.get_devices()[device_name]
+    device_info = self.get_device(device_name)
+    if device_info is None:
+      logging.error('Device %s not found after setting position.', device_name)
+      return False
     success = True
     if position and device_info.position != position:
       logging.error(
@@ -118,41 +174,56 @@ class NetsimClient(object):
       device_name: The avd name of the specified device.
       radio: The specified radio, e.g. BLUETOOTH_LOW_ENERGY, WIFI
       state: Set radio state UP if True, DOWN if False.
+
+    Raises:
+      ValueError: If the radio is not supported.
     """
-    chip = model.Chip()
-    state = model.State.ON if state else model.State.OFF
-
-    if radio == model.PhyKind.WIFI:
-      chip.wifi.state = state
-      chip.kind = common.ChipKind.WIFI
-    elif radio == model.PhyKind.UWB:
-      chip.uwb.state = state
-      chip.kind = common.ChipKind.UWB
-    else:
-      if radio == model.PhyKind.BLUETOOTH_LOW_ENERGY:
-        chip.bt.low_energy.state = state
-      elif radio == model.PhyKind.BLUETOOTH_CLASSIC:
-        chip.bt.classic.state = state
-      chip.kind = common.ChipKind.BLUETOOTH
+    if radio not in _RADIO_CHIPS:
+      raise ValueError(f'Unsupported radio: {radio}')
+    chip_kind, radio_field = _RADIO_CHIPS[radio]
 
     request = frontend.PatchDeviceRequest()
     request.device.name = device_name
-    request.device.chips.append(chip)
+    # Populate the chip in place rather than copying it in with append().
+    chip = request.device.chips.add()
+    chip.kind = chip_kind
+    radio_field(chip).state = model.State.ON if state else model.State.OFF
+
     self._stub.PatchDevice(request)
 
   def reset(self) -> None:
     """Reset all devices."""
-    self._stub.Reset(_Empty())
+    self._stub.Reset(_EMPTY)
 
   def close(self) -> None:
-    """Close the netsim client connection."""
-    if hasattr(self, "_channel"):
-      self._channel.close()
+    """Close the netsim client.
+
+    Further calls on this client raise ValueError. The underlying gRPC
+    channel is shared with other clients and stays open; use shutdown_all()
+    to close it.
+    """
+    self._closed = True
+
+  def __enter__(self) -> 'NetsimClient':
+    return self
 
-  def __del__(self) -> None:
+  def __exit__(self, *exc_info) -> None:
     self.close()
 
 
+def shutdown_all() -> None:
+  """Close all shared gRPC channels and forget the netsim server address."""
+  with _CHANNELS_LOCK:
+    for channel in _CHANNELS.values():
+      channel.close()
+    _CHANNELS.clear()
+  _get_grpc_server_addr.cache_clear()
+
+
+atexit.register(shutdown_all)
+
+
+@functools.lru_cache(maxsize=1)
 def _get_grpc_server_addr() -> str:
   """Locate the grpc server address from netsim's .ini file."""
   # TMPDIR is set on buildbots
@@ -176,7 +247,10 @@ def _get_grpc_server_addr() -> str:
     )
   with open(file_path, 'r') as f:
     for line in f:
-      key, value = line.strip().split('=')
+      # Skip blank and comment lines rather than failing to unpack them.
+      key, sep, value = line.strip().partition('=')
+      if not sep:
+        continue
       if key == 'grpc.port':
         logging.info('Found netsim server gRPC port: %s.', value)
         return f'localhost:{value}'
@@ -190,13 +264,23 @@ def _create_frontend_grpc_channel(
 ) -> _Channel:
   """Creates a gRPC channel to communicate with netsim FE service.
 
+  Channels are cached per server address so that clients share one HTTP/2
+  connection.
+
   Args:
     server_addr: Endpoint address of the netsim server.
 
   Returns:
     gRPC channel
   """
-  logging.info(
-      'Creating gRPC channel for netsim frontend service at %s.', server_addr
-  )
-  return grpc.insecure_channel(server_addr)
+  with _CHANNELS_LOCK:
+    channel = _CHANNELS.get(server_addr)
+    if channel is None:
+      logging.info(
+          'Creating gRPC channel for netsim frontend service at %s.',
+          server_addr,
+      )
+      channel = _CHANNELS[server_addr] = grpc.insecure_channel(
+          server_addr, options=_CHANNEL_OPTIONS
+      )
+    return channel
